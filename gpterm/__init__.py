@@ -9,7 +9,17 @@ from gpterm import chat
 
 @click.command()
 @click.option("--model", default="gpt-3.5-turbo", help="The model to use.")
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    help="Record the session to a file, to replay with `python -m gpterm.replay`.",
+)
 @click.argument("args", nargs=-1)
-def main(model, args):
+def main(model, record, args):
     initial_message = " ".join(args)
+    if record:
+        from gpterm import replay
+
+        replay.record(record, model=model, initial_message=initial_message or None)
+        return
     chat.chat(model=model, initial_message=initial_message or None)
@@ -2,12 +2,14 @@
 
 import logging
 import os
+import textwrap
 from dataclasses import dataclass
 from typing import List
 
 import openai
 from dotenv import load_dotenv
 
+from gpterm.chario import init_chario
 from gpterm.context import Context
 
 # Load environment variables
@@ -43,6 +45,7 @@ START_MESSAGE = {
     "role": "system",
     "content": SYSTEM,
 }
+LINE_START = "| "
 
 
 @dataclass
@@ -76,11 +79,16 @@ COMPLETION = {v: complete_openai for v in OPENAI_MODELS.values()}
 # Utilities
 
 
-def chat(model: str = "gpt-3.5-turbo", initial_message: str = None) -> None:
+def chat(
+    model: str = "gpt-3.5-turbo",
+    initial_message: str = None,
+    client: openai.OpenAI = None,
+    context: Context = None,
+) -> None:
     """Main chat function that interfaces with the OpenAI API."""
 
     # Initialize the OpenAI client with API key from the environment
-    client = openai.OpenAI()
+    client = client or openai.OpenAI()
 
     messages = [START_MESSAGE]
     if initial_message:
@@ -91,10 +99,14 @@ def chat(model: str = "gpt-3.5-turbo", initial_message: str = None) -> None:
             }
         )
     enabled = True
-    context = Context(line_start="| ")
+    if context is None:
+        init_chario()
+        context = Context(line_start=LINE_START)
 
     try:
         while True:
+            # Messages typed at the prompt are added to the history
+            typed = not initial_message
             if initial_message:
                 message = initial_message
                 initial_message = None
@@ -120,6 +132,19 @@ def chat(model: str = "gpt-3.5-turbo", initial_message: str = None) -> None:
                 model = OPENAI_MODELS[message]
                 print(f"Model set to {model}.")
                 continue
+            if cmd.startswith("search "):
+                history = context.history
+                results = history.search(
+                    message[7:],
+                    # Leave out the search command itself
+                    stop=len(history) - 1 if typed else None,
+                    skip=lambda entry: entry.content.lower().startswith("search "),
+                )
+                for entry, score in results:
+                    print(f"{score:.2f} {textwrap.shorten(entry.content, 72)}")
+                if not results:
+                    print("No matches found.")
+                continue
             if cmd.startswith("system "):
                 messages = [
                     {
@@ -2,17 +2,18 @@ import logging
 import math
 import os
 import shutil
+import signal
 import sys
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
 from time import sleep, time
-from typing import List
+from typing import Callable, List
 
-from gpterm.chario import init_chario, key, readkey
+from gpterm.chario import key, readkey
 from gpterm.history import History, HistoryEntry
 
 logger = logging.getLogger(__name__)
-# TODO not at the top level
-init_chario()
 
 
 def praw(string: str, flush=True) -> None:
@@ -56,21 +57,37 @@ class Context:
     last_key_count: int = 0
     last_key_time: float = 0
     line_start = ""
+    readkey: Callable[[], str]
+    clock: Callable[[], float]
+    watch_resize: bool = True
+    _reading: bool = False
+    _needs_reflow: bool = False
+    _reflowing: bool = False
 
     def __init__(
-        self, history: History = None, lines: List[str] = [], line_start: str = ""
+        self,
+        history: History = None,
+        lines: List[str] = [],
+        line_start: str = "",
+        readkey: Callable[[], str] = readkey,
+        clock: Callable[[], float] = time,
+        watch_resize: bool = True,
     ):
-        self.history = history or History.from_file()
+        self.history = history if history is not None else History.from_file()
         self.line_start = line_start
+        self.readkey = readkey
+        self.clock = clock
+        self.watch_resize = watch_resize
         self.reset(False)
 
     def reset(self, val=True):
         self._target_cursor = Cursor(0, 0)
         self._term_cursor = Cursor(0, 0)
         self._term_lines = []
-        self.last_key_time = time()
+        self.last_key_time = self.clock()
         self.last_key = ""
         self.last_key_count = 0
+        self._needs_reflow = False
         if val:
             self.set([""])
 
@@ -262,6 +279,42 @@ class Context:
         logger.debug("Done drawing")
         return self._term_lines
 
+    def reflow(self):
+        """Redraw the buffer wrapped to the current terminal width.
+        Resizes during the redraw are picked up by redrawing again afterwards."""
+        while True:
+            self._reflowing = True
+            self._needs_reflow = False
+            try:
+                self._reflow_once()
+            finally:
+                self._reflowing = False
+            if not self._needs_reflow:
+                return
+
+    def _reflow_once(self):
+        width = self.width()
+        logger.debug(f"Reflowing to {width}")
+        cursor = self._target_cursor
+        offset = sum(len(line) for line in self._value[: cursor.row]) + cursor.column
+
+        # Only move up over the rows drawn above the cursor. Terminals that
+        # rewrap rows may leave parts of the old buffer above, but moving further
+        # would erase earlier output on terminals that truncate them instead.
+        praw(key.UP * self._term_cursor.row + "\r\033[J", flush=False)
+
+        self._term_lines = []
+        self._term_cursor = Cursor(0, 0)
+        self._value = terminal_lines(self._value, width)
+        self.draw()
+        row = 0
+        for row, line in enumerate(self._value):
+            if offset < len(line) or row == len(self._value) - 1:
+                break
+            offset -= len(line)
+        self.set_target(Cursor(row, offset))
+        show_cursor()
+
     def _return(self):
         self.jump_to_end()
         praw("\n")
@@ -272,11 +325,25 @@ class Context:
 
     def next(self, prompt=""):
         """Get the next block of input from the user"""
+        if not self.watch_resize:
+            return self._next(prompt)
+        with watch_terminal_size():
+            return self._next(prompt)
+
+    def _next(self, prompt=""):
         if prompt:
             print(prompt)
         self.reset()
+        global _active_context
+        _active_context = self
         while True:
-            char = readkey()
+            self._reading = True
+            # Checked after setting _reading, so a resize is never left until
+            # after the next key
+            if self._needs_reflow:
+                self.reflow()
+            char = self.readkey()
+            self._reading = False
             if char == key.CTRL_D:
                 self.jump_to_end()
                 print("\n")
@@ -286,7 +353,7 @@ class Context:
             if char == "\r":
                 continue
             times = 1
-            deltat = time() - self.last_key_time
+            deltat = self.clock() - self.last_key_time
             if char == self.last_key and deltat < 0.5:
                 if char == key.ENTER and deltat < 0.3:
                     return self._return()
@@ -300,7 +367,7 @@ class Context:
                     continue
                 self.write(char * times)
             self.last_key = char
-            self.last_key_time = time()
+            self.last_key_time = self.clock()
 
     def save(self):
         self.history.save()
@@ -311,8 +378,49 @@ def repeat_times(times_repeated: int, deltat: float):
     return 1 if times_repeated <= 2 else round(min(times_repeated, 6)*factor)
 
 
+_terminal_size = shutil.get_terminal_size()
+_active_context: Context = None
+
+
 def terminal_width() -> int:
-    return shutil.get_terminal_size().columns
+    return _terminal_size.columns
+
+
+def terminal_size() -> os.terminal_size:
+    return _terminal_size
+
+
+def set_terminal_size(size: os.terminal_size) -> None:
+    """Set the cached terminal geometry."""
+    global _terminal_size
+    _terminal_size = size
+
+
+def _handle_resize(signum, frame) -> None:
+    """Refresh the terminal geometry and reflow the context being edited.
+    Reflows immediately when waiting on a key, otherwise before reading the next one
+    or once the current reflow finishes."""
+    set_terminal_size(shutil.get_terminal_size())
+    context = _active_context
+    if context is not None:
+        context._needs_reflow = True
+        if context._reading and not context._reflowing:
+            context.reflow()
+
+
+@contextmanager
+def watch_terminal_size():
+    """Refresh the terminal geometry, and keep it up to date until exiting."""
+    set_terminal_size(shutil.get_terminal_size())
+    # Signal handlers can only be set from the main thread
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGWINCH, _handle_resize)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGWINCH, signal.SIG_DFL if previous is None else previous)
 
 
 def line_count(lines: List[str]) -> int:
@@ -321,8 +429,9 @@ def line_count(lines: List[str]) -> int:
     return sum([math.ceil(len(line) / width) for line in lines])
 
 
-def terminal_lines(lines: str | List[str], width=terminal_width()) -> int:
+def terminal_lines(lines: str | List[str], width: int = None) -> int:
     """Return the lines as they would be printed to the terminal."""
+    width = width or terminal_width()
     if isinstance(lines, list):
         lines = "".join(lines)
     lines = lines.splitlines(True) or [""]
@@ -2,10 +2,13 @@ import dataclasses
 import json
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import TYPE_CHECKING, Callable, List
 
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from gpterm.search import SearchIndex
+
 load_dotenv()
 
 
@@ -22,18 +25,24 @@ class HistoryEntry:
 DEFAULT_HISTORY_FILE = os.getenv("CHAT_HISTORY_FILE", "./.chat_history")
 
 
+def search_index_file(file: str) -> str:
+    return file + ".index"
+
+
 @dataclass
 class History:
     history: List[HistoryEntry]
     _start_index: int
     index: int
     file: str = DEFAULT_HISTORY_FILE
+    _search_index: "SearchIndex" = None
 
     def __init__(self, history: List[HistoryEntry], index: int, file: str = None):
         self.history = history
         self._start_index = len(history)
         self.index = index
         self.file = file or self.file
+        self._search_index = None
 
     @staticmethod
     def from_file(file: str = None):
@@ -50,6 +59,8 @@ class History:
 
     def save(self, file: str = None, append=True):
         file = file or self.file
+        if self._search_index is not None and file == self.file:
+            self._search_index.save(search_index_file(file))
         with open(file, "a" if append else "w") as file:
             file.write(
                 "".join(
@@ -69,6 +80,39 @@ class History:
     def append(self, entry: HistoryEntry):
         self.history.append(entry)
         self.index = len(self.history)
+        if self._search_index is not None:
+            self._search_index.add(entry.content)
+
+    @property
+    def search_index(self) -> "SearchIndex":
+        """The similarity index of the history, loaded on first use."""
+        if self._search_index is None:
+            # Imported here so that numpy is only loaded once it is needed
+            from gpterm.search import SearchIndex
+
+            self._search_index = SearchIndex.load(
+                search_index_file(self.file), [entry.content for entry in self.history]
+            )
+        return self._search_index
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        stop: int = None,
+        skip: Callable[[HistoryEntry], bool] = None,
+    ):
+        """Return the (entry, score) of the k past entries most similar to the query,
+        leaving out any entries for which `skip` returns True."""
+        count = k
+        while True:
+            matches = self.search_index.search(query, count, stop)
+            results = [
+                (self[i], score) for i, score in matches if not (skip and skip(self[i]))
+            ]
+            if len(results) >= k or len(matches) < count:
+                return results[:k]
+            count *= 4
 
     def next(self):
         if self.index <= len(self.history):
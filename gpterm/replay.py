@@ -0,0 +1,292 @@
+"""Record chat sessions and replay them offline to measure performance.
+
+A recording is a JSON lines file. The first line describes the session, and is
+followed by the keys read and the completion chunks received, each with the
+time in seconds since the session started.
+"""
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+from collections import deque
+from dataclasses import dataclass, field
+from time import monotonic, perf_counter
+from types import SimpleNamespace
+from typing import Callable, List
+
+import click
+import openai
+
+from gpterm import chat
+from gpterm.chario import init_chario, key, readkey
+from gpterm.context import Context, set_terminal_size, terminal_size
+from gpterm.history import History
+
+
+def completions_client(create: Callable) -> SimpleNamespace:
+    """Wrap a completion function in the shape of an OpenAI client."""
+    completions = SimpleNamespace(create=create)
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+class Recorder:
+    """Writes the keys and completion chunks of a session to a file."""
+
+    def __init__(self, file: str):
+        self.file = open(file, "w")
+        self.start = monotonic()
+
+    def write(self, event: str, **fields):
+        fields = {"event": event, "time": monotonic() - self.start, **fields}
+        self.file.write(json.dumps(fields) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def readkey(self, readkey: Callable[[], str] = readkey) -> Callable[[], str]:
+        def recorded():
+            try:
+                char = readkey()
+            except KeyboardInterrupt:
+                self.write("key", key=key.CTRL_C)
+                raise
+            self.write("key", key=char)
+            return char
+
+        return recorded
+
+    def client(self, client: openai.OpenAI) -> SimpleNamespace:
+        def create(**kwargs):
+            self.write("completion")
+            stream = client.chat.completions.create(**kwargs)
+            for part in stream:
+                choice = part.choices[0]
+                self.write(
+                    "chunk",
+                    content=choice.delta.content,
+                    finish_reason=choice.finish_reason,
+                )
+                yield part
+
+        return completions_client(create)
+
+
+def record(file: str, model: str = "gpt-3.5-turbo", initial_message: str = None):
+    """Run an interactive chat, recording it to a file."""
+    init_chario()
+    size = terminal_size()
+    recorder = Recorder(file)
+    recorder.write(
+        "session",
+        model=model,
+        initial_message=initial_message,
+        columns=size.columns,
+        lines=size.lines,
+    )
+    try:
+        chat.chat(
+            model=model,
+            initial_message=initial_message,
+            client=recorder.client(openai.OpenAI()),
+            context=Context(line_start=chat.LINE_START, readkey=recorder.readkey()),
+        )
+    finally:
+        recorder.close()
+
+
+class FakeTerminal(io.TextIOBase):
+    """An output stream that only counts what is written to it."""
+
+    writes: int = 0
+    flushes: int = 0
+    bytes: int = 0
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return True
+
+    def write(self, string: str) -> int:
+        self.writes += 1
+        self.bytes += len(string.encode())
+        return len(string)
+
+    def flush(self):
+        self.flushes += 1
+
+
+@dataclass
+class Report:
+    total: float = 0
+    key_latencies: List[float] = field(default_factory=list)
+    chunk_latencies: List[float] = field(default_factory=list)
+    writes: int = 0
+    flushes: int = 0
+    bytes: int = 0
+
+    def summary(self) -> dict:
+        """Return the report with latencies in milliseconds."""
+        return {
+            "total_ms": self.total * 1000,
+            "keys": len(self.key_latencies),
+            "key_ms": latency_summary(self.key_latencies),
+            "chunks": len(self.chunk_latencies),
+            "chunk_ms": latency_summary(self.chunk_latencies),
+            "writes": self.writes,
+            "flushes": self.flushes,
+            "bytes": self.bytes,
+        }
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[round((len(values) - 1) * p)]
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    return {
+        "mean": sum(latencies) * 1000 / max(len(latencies), 1),
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "max": max(latencies, default=0) * 1000,
+    }
+
+
+class Replayer:
+    """Feeds recorded keys and completion chunks back to a chat.
+    Time follows the recording, so the chat sees the same key timing."""
+
+    def __init__(self, events: List[dict]):
+        self.now = 0.0
+        self.keys = deque()
+        self.completions = deque()
+        self.report = Report()
+        self._key_start = None
+        for event in events:
+            if event["event"] == "key":
+                self.keys.append(event)
+            elif event["event"] == "completion":
+                self.completions.append([])
+            elif event["event"] == "chunk":
+                self.completions[-1].append(event)
+
+    def clock(self) -> float:
+        return self.now
+
+    def _end_key(self):
+        if self._key_start is not None:
+            self.report.key_latencies.append(perf_counter() - self._key_start)
+            self._key_start = None
+
+    def readkey(self) -> str:
+        """Return the next recorded key, ending the chat once they run out."""
+        self._end_key()
+        if not self.keys:
+            return key.CTRL_D
+        event = self.keys.popleft()
+        self.now = event["time"]
+        if event["key"] == key.CTRL_C:
+            raise KeyboardInterrupt
+        self._key_start = perf_counter()
+        return event["key"]
+
+    def create(self, **kwargs):
+        self._end_key()
+        chunks = self.completions.popleft() if self.completions else []
+        for chunk in chunks:
+            self.now = chunk["time"]
+            part = SimpleNamespace(
+                choices=[
+                    SimpleNamespace(
+                        delta=SimpleNamespace(content=chunk["content"]),
+                        finish_reason=chunk["finish_reason"],
+                    )
+                ]
+            )
+            start = perf_counter()
+            yield part
+            # Only reached when the next chunk is asked for, so the chunk that
+            # ends the completion is not measured
+            self.report.chunk_latencies.append(perf_counter() - start)
+
+    def client(self) -> SimpleNamespace:
+        return completions_client(self.create)
+
+
+def load(file: str) -> List[dict]:
+    with open(file, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def replay(file: str) -> Report:
+    """Replay a recorded session against a fake terminal and client.
+    History navigation replays against an empty history."""
+    events = load(file)
+    session = events[0]
+    replayer = Replayer(events[1:])
+    terminal = FakeTerminal()
+    size = terminal_size()
+    set_terminal_size(os.terminal_size((session["columns"], session["lines"])))
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            history = History([], 0, os.path.join(directory, "history"))
+            context = Context(
+                history,
+                line_start=chat.LINE_START,
+                readkey=replayer.readkey,
+                clock=replayer.clock,
+                watch_resize=False,
+            )
+            with contextlib.redirect_stdout(terminal):
+                start = perf_counter()
+                chat.chat(
+                    model=session["model"],
+                    initial_message=session["initial_message"],
+                    client=replayer.client(),
+                    context=context,
+                )
+                # The key ending the session is not followed by another read
+                replayer._end_key()
+                replayer.report.total = perf_counter() - start
+    finally:
+        set_terminal_size(size)
+    report = replayer.report
+    report.writes = terminal.writes
+    report.flushes = terminal.flushes
+    report.bytes = terminal.bytes
+    return report
+
+
+@click.command()
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--json", "as_json", is_flag=True, help="Print the report as JSON.")
+@click.option(
+    "--max-latency",
+    type=float,
+    help="Fail if the 95th percentile key latency exceeds this many milliseconds.",
+)
+def main(file, as_json, max_latency):
+    """Replay a recorded session and report its performance."""
+    summary = replay(file).summary()
+    if as_json:
+        click.echo(json.dumps(summary, indent=2))
+    else:
+        for name, value in summary.items():
+            if isinstance(value, dict):
+                value = " ".join(f"{k}={v:.3f}" for k, v in value.items())
+            elif isinstance(value, float):
+                value = f"{value:.3f}"
+            click.echo(f"{name}: {value}")
+    if max_latency is not None and summary["key_ms"]["p95"] > max_latency:
+        raise click.ClickException(
+            f"p95 key latency {summary['key_ms']['p95']:.3f}ms exceeds {max_latency}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
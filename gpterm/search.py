@@ -0,0 +1,201 @@
+"""Offline similarity search over chat history."""
+
+import logging
+import os
+import zlib
+from math import prod
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = 256
+# Texts vectorized at once, bounding the memory used while building the index
+BATCH = 4096
+# Rows converted to float32 at once while searching
+BLOCK = 4096
+# Vectors are stored as int8, scaled so that unit length components fit
+DTYPE = np.int8
+SCALE = 127
+# Fibonacci hashing multiplier, spreading trigram codes over the high bits
+MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+def vectorize_many(texts: List[str], dimensions: int = DIMENSIONS) -> np.ndarray:
+    """Hash the character trigrams of each text into a row of unit length.
+    Words are lowercased and padded with spaces, so trigrams mark word edges."""
+    texts = [" " + " ".join(text.lower().split()) + " " for text in texts]
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype=np.uint32)
+    codes = codes.astype(np.uint64)
+    rows = np.repeat(np.arange(len(texts)), lengths)
+    # Keep only the trigrams that start and end in the same text
+    starts = np.flatnonzero(rows[:-2] == rows[2:])
+    hashes = (
+        (codes[starts] << np.uint64(42))
+        ^ (codes[starts + 1] << np.uint64(21))
+        ^ codes[starts + 2]
+    ) * MULTIPLIER
+    columns = (hashes >> np.uint64(40)) % np.uint64(dimensions)
+    # The high bit picks a sign so that collisions tend to cancel out
+    signs = np.where(hashes >> np.uint64(63), 1.0, -1.0)
+    vectors = np.bincount(
+        rows[starts] * dimensions + columns.astype(np.int64),
+        weights=signs,
+        minlength=len(texts) * dimensions,
+    ).reshape(len(texts), dimensions)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms, norms, 1)).astype(np.float32)
+
+
+def vectorize(text: str, dimensions: int = DIMENSIONS) -> np.ndarray:
+    return vectorize_many([text], dimensions)[0]
+
+
+def quantize(vectors: np.ndarray) -> np.ndarray:
+    return np.round(vectors * SCALE).astype(DTYPE)
+
+
+def digest(text: str) -> int:
+    return zlib.crc32(text.encode())
+
+
+def map_file(file: str, dtype, row_shape: Tuple[int, ...] = ()) -> np.ndarray:
+    """Memory-map a file of raw rows read-only, or return no rows if it is missing."""
+    row_size = np.dtype(dtype).itemsize * prod(row_shape)
+    try:
+        rows = os.path.getsize(file) // row_size
+    except OSError:
+        rows = 0
+    if not rows:
+        return np.zeros((0, *row_shape), dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode="r", shape=(rows, *row_shape))
+
+
+def similarities(vectors: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Return the dot product of each stored row with the query, converting the
+    rows to float32 a block at a time since integer products are not vectorized."""
+    query = query / SCALE
+    blocks = [
+        vectors[start : start + BLOCK].astype(np.float32) @ query
+        for start in range(0, len(vectors), BLOCK)
+    ]
+    return np.concatenate([np.zeros(0, dtype=np.float32), *blocks])
+
+
+def grow(array: np.ndarray, rows: int) -> np.ndarray:
+    grown = np.zeros((rows, *array.shape[1:]), dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class SearchIndex:
+    """Hashed n-gram vectors of a list of texts, searchable by cosine similarity.
+
+    Rows loaded from a file stay memory-mapped, and rows added afterwards are kept
+    in memory until they are appended to the file on save. Each row is stored
+    with a digest of its text, so rows that no longer match are rebuilt on load."""
+
+    dimensions: int
+    _mapped: np.ndarray
+    _mapped_keys: np.ndarray
+    _added: np.ndarray
+    _added_keys: np.ndarray
+    _added_size: int
+    _saved: int
+    _rewrite: bool
+
+    def __init__(self, dimensions: int = DIMENSIONS):
+        self.dimensions = dimensions
+        self._mapped = np.zeros((0, dimensions), dtype=DTYPE)
+        self._mapped_keys = np.zeros(0, dtype=np.uint32)
+        self._added = np.zeros((0, dimensions), dtype=DTYPE)
+        self._added_keys = np.zeros(0, dtype=np.uint32)
+        self._added_size = 0
+        self._saved = 0
+        self._rewrite = False
+
+    def __len__(self):
+        return len(self._mapped) + self._added_size
+
+    def add(self, text: str):
+        self.extend([text])
+
+    def extend(self, texts: Iterable[str]):
+        texts = list(texts)
+        if not texts:
+            return
+        size = self._added_size + len(texts)
+        if size > len(self._added):
+            capacity = max(size, 2 * len(self._added), 64)
+            self._added = grow(self._added, capacity)
+            self._added_keys = grow(self._added_keys, capacity)
+        for start in range(0, len(texts), BATCH):
+            batch = texts[start : start + BATCH]
+            row = self._added_size + start
+            vectors = vectorize_many(batch, self.dimensions)
+            self._added[row : row + len(batch)] = quantize(vectors)
+        self._added_keys[self._added_size : size] = [digest(text) for text in texts]
+        self._added_size = size
+
+    def search(
+        self, query: str, k: int = 5, stop: int = None
+    ) -> List[Tuple[int, float]]:
+        """Return the (index, score) of the k best matches, best first.
+        Only the first `stop` texts are searched if it is given."""
+        stop = len(self) if stop is None else max(min(stop, len(self)), 0)
+        if not stop or k <= 0:
+            return []
+        query = vectorize(query, self.dimensions)
+        mapped = self._mapped[:stop]
+        added = self._added[: stop - len(mapped)]
+        scores = np.concatenate(
+            [similarities(mapped, query), similarities(added, query)]
+        )
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def save(self, file: str):
+        """Append the new rows to the file, or replace it if it had stale rows."""
+        keys_file = file + ".keys"
+        if self._rewrite:
+            vectors = (self._mapped, self._added[: self._added_size])
+            keys = (self._mapped_keys, self._added_keys[: self._added_size])
+            # Replace rather than truncate the files, since they may still be mapped
+            for path, parts in ((file, vectors), (keys_file, keys)):
+                with open(path + ".tmp", "wb") as f:
+                    for part in parts:
+                        part.tofile(f)
+                os.replace(path + ".tmp", path)
+        elif self._saved < self._added_size:
+            new = slice(self._saved, self._added_size)
+            with open(file, "ab") as f:
+                self._added[new].tofile(f)
+            with open(keys_file, "ab") as f:
+                self._added_keys[new].tofile(f)
+        self._saved = self._added_size
+        self._rewrite = False
+
+    @staticmethod
+    def load(file: str, texts: List[str], dimensions: int = DIMENSIONS):
+        """Load the index of the texts from a file, rebuilding any rows that are
+        missing or were stored for a different text."""
+        index = SearchIndex(dimensions)
+        vectors = map_file(file, DTYPE, (dimensions,))
+        keys = map_file(file + ".keys", np.uint32)
+        rows = min(len(vectors), len(keys), len(texts))
+        digests = np.fromiter(
+            (digest(text) for text in texts[:rows]), dtype=np.uint32, count=rows
+        )
+        mismatch = np.flatnonzero(digests != keys[:rows])
+        valid = int(mismatch[0]) if len(mismatch) else rows
+        if valid < rows:
+            logger.info(f"Rebuilding search index from row {valid}")
+        index._mapped = vectors[:valid]
+        index._mapped_keys = keys[:valid]
+        index._rewrite = valid != len(vectors) or valid != len(keys)
+        index.extend(texts[valid:])
+        return index
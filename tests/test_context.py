@@ -0,0 +1,105 @@
+import io
+import os
+import signal
+import sys
+
+import pytest
+
+from gpterm import context
+from gpterm.chario import key
+from gpterm.context import Context, CursorMotion
+from gpterm.history import History
+
+
+@pytest.fixture(autouse=True)
+def terminal(monkeypatch):
+    """Write to a StringIO and restore the cached terminal size afterwards."""
+    monkeypatch.setattr(sys, "stdout", io.StringIO())
+    size = context.terminal_size()
+    yield
+    context.set_terminal_size(size)
+
+
+def resize(columns: int):
+    context.set_terminal_size(os.terminal_size((columns, 24)))
+
+
+def make_context(tmp_path, **kwargs) -> Context:
+    history = History([], 0, str(tmp_path / "history"))
+    return Context(history, line_start="| ", **kwargs)
+
+
+def cursor_offset(ctx: Context) -> int:
+    cursor = ctx._target_cursor
+    return sum(len(line) for line in ctx._value[: cursor.row]) + cursor.column
+
+
+def test_terminal_lines_uses_current_width():
+    resize(10)
+    assert context.terminal_lines("a" * 25) == ["a" * 10, "a" * 10, "a" * 5]
+    resize(20)
+    assert context.terminal_lines("a" * 25) == ["a" * 20, "a" * 5]
+
+
+@pytest.mark.parametrize("columns", [12, 40])
+def test_reflow_keeps_value_and_cursor(tmp_path, columns):
+    resize(22)
+    ctx = make_context(tmp_path, watch_resize=False)
+    ctx.reset()
+    ctx.write("hello world this is a long line\nsecond")
+    ctx.move(CursorMotion(-1, 3))
+    value = ctx.value
+    offset = cursor_offset(ctx)
+
+    resize(columns)
+    ctx.reflow()
+    assert ctx.value == value
+    assert cursor_offset(ctx) == offset
+    assert all(len(line.rstrip("\n")) <= columns - 2 for line in ctx._value)
+
+
+def test_resize_during_reflow_does_not_nest(tmp_path, monkeypatch):
+    resize(22)
+    ctx = make_context(tmp_path, watch_resize=False)
+    ctx.reset()
+    ctx.write("hello world this is a long line")
+    monkeypatch.setattr(context, "_active_context", ctx)
+    monkeypatch.setattr(context.shutil, "get_terminal_size", context.terminal_size)
+    ctx._reading = True
+
+    depth = 0
+    calls = []
+    reflow_once = ctx._reflow_once
+
+    def resized_reflow():
+        nonlocal depth
+        depth += 1
+        calls.append(depth)
+        if len(calls) < 3:
+            context._handle_resize(signal.SIGWINCH, None)
+        reflow_once()
+        depth -= 1
+
+    monkeypatch.setattr(ctx, "_reflow_once", resized_reflow)
+    context._handle_resize(signal.SIGWINCH, None)
+    assert calls == [1, 1, 1]
+    assert not ctx._needs_reflow
+
+
+def test_next_restores_resize_handler(tmp_path):
+    def handler(signum, frame):
+        pass
+
+    installed = []
+
+    def readkey():
+        installed.append(signal.getsignal(signal.SIGWINCH))
+        return key.CTRL_D
+
+    previous = signal.signal(signal.SIGWINCH, handler)
+    try:
+        make_context(tmp_path, readkey=readkey).next()
+        assert installed == [context._handle_resize]
+        assert signal.getsignal(signal.SIGWINCH) is handler
+    finally:
+        signal.signal(signal.SIGWINCH, previous)
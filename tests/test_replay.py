@@ -0,0 +1,42 @@
+import os
+
+from click.testing import CliRunner
+
+from gpterm import replay
+
+SESSION = os.path.join(os.path.dirname(__file__), "data", "session.jsonl")
+
+
+def test_replay_is_deterministic(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    first = replay.replay(SESSION)
+    second = replay.replay(SESSION)
+    assert (first.writes, first.flushes, first.bytes) == (
+        second.writes,
+        second.flushes,
+        second.bytes,
+    )
+    # The replay must not touch the history in the working directory
+    assert not [name for name in os.listdir(tmp_path) if "history" in name]
+
+
+def test_replay_summary(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    summary = replay.replay(SESSION).summary()
+    keys = [event for event in replay.load(SESSION) if event["event"] == "key"]
+    # Every key played back, including the Ctrl-D ending the session
+    assert summary["keys"] == len(keys) == 58
+    # The chunk ending the completion is not measured
+    assert summary["chunks"] == 10
+    assert summary["bytes"] > 0
+    assert 0 < summary["key_ms"]["p50"] <= summary["key_ms"]["max"]
+
+
+def test_max_latency(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    runner = CliRunner()
+    result = runner.invoke(replay.main, [SESSION, "--max-latency", "1000"])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(replay.main, [SESSION, "--max-latency", "0"])
+    assert result.exit_code == 1
+    assert "p95 key latency" in result.output
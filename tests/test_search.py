@@ -0,0 +1,101 @@
+import os
+
+import pytest
+
+from gpterm.history import History, HistoryEntry, search_index_file
+from gpterm.search import DIMENSIONS, SearchIndex
+
+ENTRIES = ["kubernetes pods", "python decorators", "sql joins"]
+
+
+@pytest.fixture
+def history_file(tmp_path):
+    """A history file with a saved index of ENTRIES."""
+    file = str(tmp_path / "history")
+    history = History.from_file(file)
+    for content in ENTRIES:
+        history.append(HistoryEntry(content))
+    history.search_index
+    history.save()
+    return file
+
+
+def contents(results):
+    return [entry.content for entry, _ in results]
+
+
+def rows(file: str) -> int:
+    return os.path.getsize(search_index_file(file)) // DIMENSIONS
+
+
+def test_search_ranking():
+    index = SearchIndex()
+    index.extend(ENTRIES + ["rust borrow checker"])
+    results = index.search("borrow checker in rust")
+    assert results[0][0] == 3
+    assert [score for _, score in results] == sorted(
+        (score for _, score in results), reverse=True
+    )
+    assert index.search("borrow checker in rust", k=1) == results[:1]
+
+
+def test_search_stop():
+    index = SearchIndex()
+    index.extend(ENTRIES + ["rust borrow checker"])
+    assert 3 not in [i for i, _ in index.search("rust borrow checker", stop=3)]
+    assert index.search("rust borrow checker", stop=0) == []
+
+
+def test_search_skip(tmp_path):
+    history = History([], 0, str(tmp_path / "history"))
+    for content in ["search sql", "sql joins", "search sql joins"]:
+        history.append(HistoryEntry(content))
+    skip = lambda entry: entry.content.startswith("search ")
+    assert contents(history.search("sql joins", skip=skip)) == ["sql joins"]
+
+
+def test_save_and_reload(history_file):
+    assert rows(history_file) == len(ENTRIES)
+    history = History.from_file(history_file)
+    assert contents(history.search("python decorator"))[0] == "python decorators"
+    index = history.search_index
+    assert len(index._mapped) == len(ENTRIES)
+    assert not index._rewrite
+
+
+def test_unindexed_entries_are_caught_up(history_file):
+    # A session that never searched saves entries without indexing them
+    history = History.from_file(history_file)
+    history.append(HistoryEntry("rust borrow checker"))
+    history.save()
+    assert rows(history_file) == len(ENTRIES)
+
+    history = History.from_file(history_file)
+    assert contents(history.search("rust borrow checker"))[0] == "rust borrow checker"
+    assert not history.search_index._rewrite
+    history.save()
+    assert rows(history_file) == len(ENTRIES) + 1
+
+
+def test_out_of_order_saves_are_rebuilt(history_file):
+    first = History.from_file(history_file)
+    second = History.from_file(history_file)
+    first.search_index
+    first.append(HistoryEntry("banana bread"))
+    second.append(HistoryEntry("rust borrow checker"))
+    second.save()
+    first.save()
+
+    # The index row for "banana bread" now sits where "rust borrow checker" is
+    history = History.from_file(history_file)
+    index = history.search_index
+    assert index._rewrite
+    assert len(index._mapped) == len(ENTRIES)
+    assert contents(history.search("rust borrow checker"))[0] == "rust borrow checker"
+    assert contents(history.search("banana bread"))[0] == "banana bread"
+
+    history.save()
+    assert not os.path.exists(search_index_file(history_file) + ".tmp")
+    history = History.from_file(history_file)
+    assert not history.search_index._rewrite
+    assert len(history.search_index._mapped) == len(ENTRIES) + 2